@@ -1,9 +1,394 @@
 import streamlit as st
 import pandas as pd
-import geopandas as gpd
-from sqlalchemy import create_engine
-from geoalchemy2 import Geometry, WKTElement
+import numpy as np
+from sqlalchemy import create_engine, text
 import os
+import shutil
+import tempfile
+import threading
+import time
+from types import SimpleNamespace
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, as_completed, wait
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+import pyarrow.dataset as ds
+import pyarrow.fs as pafs
+import ast
+import json
+import pyproj
+
+try:
+    # Optional: writes Arrow batches straight to Postgres with binary COPY
+    import adbc_driver_postgresql.dbapi as adbc_pg
+except ImportError:
+    adbc_pg = None
+
+# Batches converted and written concurrently; each worker holds one pooled connection.
+IMPORT_WORKERS = 4
+
+# Per-session memory for rebuilding indexes after an append. Indexes are rebuilt
+# IMPORT_WORKERS at a time, so the server may use up to that many times this.
+INDEX_MAINTENANCE_WORK_MEM = '512MB'
+
+# Batches follow the file's row groups, clamped to this range so tiny row groups
+# don't turn into tiny writes and huge ones don't blow up memory per worker.
+MIN_BATCH_ROWS = 10_000
+MAX_BATCH_ROWS = 200_000
+
+# Minimum seconds between progress bar/status redraws; every update is a Streamlit
+# round-trip to the browser, which adds up with many small batches
+PROGRESS_UPDATE_INTERVAL = 0.1
+
+# pandas-style if_exists -> ADBC ingest mode for the first batch
+ADBC_INGEST_MODES = {'fail': 'create', 'replace': 'replace', 'append': 'create_append'}
+
+
+def psql_insert_copy(table, conn, keys, data_iter):
+    """
+    pandas `to_sql` insertion method that streams rows through COPY FROM STDIN.
+
+    One round-trip per chunk instead of one INSERT per row. Uses psycopg 3's
+    `cursor.copy`, which does the row encoding.
+    """
+    dbapi_conn = conn.connection
+    columns = ', '.join(f'"{k}"' for k in keys)
+    table_name = f'"{table.schema}"."{table.name}"' if table.schema else f'"{table.name}"'
+
+    with dbapi_conn.cursor() as cur:
+        with cur.copy(f"COPY {table_name} ({columns}) FROM STDIN") as copy:
+            for row in data_iter:
+                copy.write_row(row)
+
+
+def read_geo_metadata(parquet_metadata):
+    """GeoParquet `geo` metadata from the file footer, or None for plain Parquet."""
+    key_value_metadata = parquet_metadata.metadata or {}
+    if b"geo" not in key_value_metadata:
+        return None
+    return json.loads(key_value_metadata[b"geo"])
+
+
+def geo_column_crs(column_meta):
+    """
+    CRS of a GeoParquet geometry column. Per the spec a missing "crs" means
+    OGC:CRS84 and an explicit null means unknown.
+    """
+    if "crs" not in column_meta:
+        return pyproj.CRS("OGC:CRS84")
+    crs = column_meta["crs"]
+    if crs is None:
+        return None
+    # PROJJSON since GeoParquet 0.4, WKT before that
+    return pyproj.CRS.from_json_dict(crs) if isinstance(crs, dict) else pyproj.CRS.from_user_input(crs)
+
+
+def crs_to_srid(crs, default=4326):
+    """Best-effort EPSG code for a CRS, the same way geopandas' to_postgis resolves it."""
+    if crs is None:
+        return default
+    srid = crs.to_epsg(min_confidence=25)
+    if srid is None and crs.equals("EPSG:4326", ignore_axis_order=True):
+        # OGC:CRS84 (the GeoParquet default) is EPSG:4326 with lon/lat axis order
+        srid = 4326
+    return srid or 0
+
+
+def postgis_geometry_type(geometry_types):
+    """
+    geometry(...) subtype for a GeoParquet `geometry_types` list, e.g.
+    ["Polygon Z"] -> "PolygonZ"; mixed or unknown types -> "Geometry".
+    """
+    if len(geometry_types) == 1:
+        return geometry_types[0].replace(' ', '')
+    dimensions = {geometry_type.partition(' ')[2] for geometry_type in geometry_types}
+    return 'Geometry' + (dimensions.pop() if len(dimensions) == 1 else '')
+
+
+def is_binary_type(arrow_type):
+    return pa.types.is_binary(arrow_type) or pa.types.is_large_binary(arrow_type)
+
+
+def storage_type(arrow_type):
+    """The plain Arrow type behind an extension type (e.g. geoarrow.wkb); other types unchanged."""
+    return arrow_type.storage_type if isinstance(arrow_type, pa.ExtensionType) else arrow_type
+
+
+def is_wkb_type(arrow_type):
+    """Arrow types a WKB geometry column can arrive as: raw binary or hex strings (possibly dictionary-encoded or wrapped in an extension type)."""
+    arrow_type = storage_type(arrow_type)
+    if pa.types.is_dictionary(arrow_type):
+        arrow_type = arrow_type.value_type
+    return is_binary_type(arrow_type) or pa.types.is_string(arrow_type) or pa.types.is_large_string(arrow_type)
+
+
+def bytea_input(array):
+    """
+    Turn an Arrow WKB column into bytea text input (`\\x...`) for COPY, keeping
+    nulls: raw WKB is hex-encoded, hex strings only need the prefix.
+    """
+    if isinstance(array, pa.ExtensionArray):
+        array = array.storage
+    if pa.types.is_dictionary(array.type):
+        array = array.dictionary_decode()
+    if is_binary_type(array.type):
+        values = array.to_numpy(zero_copy_only=False)
+        out = np.full(len(values), None, dtype=object)
+        mask = pd.notna(values)
+        out[mask] = '\\x' + np.frompyfunc(bytes.hex, 1, 1)(values[mask])
+        return out
+    return pc.binary_join_element_wise('\\x', array, '').to_numpy(zero_copy_only=False)
+
+
+def geometry_column_ddl(table_name, geometry_col, geometry_type, srid, if_exists, has_attributes):
+    """
+    Statements that give the target table its geometry column. With attribute
+    columns the table already exists (created by pandas/ADBC) and only needs the
+    column added; a geometry-only table is created here, honouring `if_exists`.
+    """
+    column = f'"{geometry_col}" geometry({geometry_type}, {srid})'
+    if has_attributes:
+        return [f'ALTER TABLE "{table_name}" ADD COLUMN IF NOT EXISTS {column}']
+    if if_exists == 'replace':
+        return [f'DROP TABLE IF EXISTS "{table_name}"', f'CREATE TABLE "{table_name}" ({column})']
+    if if_exists == 'append':
+        return [f'CREATE TABLE IF NOT EXISTS "{table_name}" ({column})']
+    # 'fail': a plain CREATE TABLE errors out if the table exists
+    return [f'CREATE TABLE "{table_name}" ({column})']
+
+
+def wkb_insert_select(table_name, stage_name, attr_names, geometry_col, wkb_expr, srid):
+    """INSERT ... SELECT moving staged rows into the target, building geometries with ST_GeomFromWKB."""
+    attr_cols = [f'"{c}"' for c in attr_names]
+    target_cols = ', '.join(attr_cols + [f'"{geometry_col}"'])
+    select_cols = ', '.join(attr_cols + [f'ST_GeomFromWKB({wkb_expr}, {srid})'])
+    return f'INSERT INTO "{table_name}" ({target_cols}) SELECT {select_cols} FROM "{stage_name}"'
+
+
+def create_wkb_table(df, table_name, conn, geometry_col, geometry_type, srid, if_exists):
+    """
+    Create the target table for the WKB COPY path: attribute columns typed the way
+    pandas would create them, plus a PostGIS geometry column whose type and SRID
+    are fixed up front, so batches are appended into a known schema.
+    """
+    attributes = df.drop(columns=[geometry_col])
+    if len(attributes.columns):
+        attributes.head(0).to_sql(table_name, conn, if_exists=if_exists, index=False)
+    for statement in geometry_column_ddl(table_name, geometry_col, geometry_type, srid, if_exists,
+                                         has_attributes=len(attributes.columns) > 0):
+        conn.execute(text(statement))
+
+
+def write_wkb_chunk(df, table_name, conn, geometry_col, srid):
+    """
+    Append a chunk whose geometry column holds WKB as bytea text input (see
+    bytea_input), without decoding any geometry in Python.
+
+    The chunk is COPYed into a temporary staging table where the geometry
+    column is bytea, then PostGIS builds the geometries with ST_GeomFromWKB in
+    one INSERT ... SELECT. Must run inside a transaction.
+    """
+    stage_name = f"stage_{table_name}"
+    conn.execute(text(f'CREATE TEMP TABLE "{stage_name}" (LIKE "{table_name}") ON COMMIT DROP'))
+    conn.execute(text(f'ALTER TABLE "{stage_name}" ALTER COLUMN "{geometry_col}" TYPE bytea USING NULL'))
+
+    df.to_sql(stage_name, conn, if_exists='append', index=False, method=psql_insert_copy)
+
+    attr_names = [c for c in df.columns if c != geometry_col]
+    conn.execute(text(wkb_insert_select(table_name, stage_name, attr_names, geometry_col, f'"{geometry_col}"', srid)))
+    # Dropped explicitly as well, since the transaction may span many chunks
+    conn.execute(text(f'DROP TABLE "{stage_name}"'))
+
+
+def adbc_write_batch(conn, batch, table_name, mode, existing_table):
+    """
+    Write an Arrow batch on the ADBC connection `conn` with binary COPY, skipping
+    the pandas conversion and text serialization entirely. Committing is up to
+    the caller.
+
+    Binary COPY does no casts, so when appending to a table this import didn't
+    create (`existing_table`, whose columns may be e.g. INTEGER where the batch
+    has int64) the batch goes through a temporary staging table and an
+    INSERT ... SELECT, which lets the server cast.
+    """
+    with conn.cursor() as cur:
+        if not existing_table:
+            cur.adbc_ingest(table_name, batch, mode=mode)
+            return
+
+        if mode == 'create_append':
+            # Creates the table from the Arrow schema if it's missing; an existing one is left as is
+            cur.adbc_ingest(table_name, batch.slice(0, 0), mode=mode)
+        stage_name = f"stage_{table_name}"
+        columns = ', '.join(f'"{c}"' for c in batch.schema.names)
+        cur.adbc_ingest(stage_name, batch, mode='replace', temporary=True)
+        cur.execute(f'INSERT INTO "{table_name}" ({columns}) SELECT {columns} FROM "{stage_name}"')
+        # Dropped explicitly, since the transaction may span many batches
+        cur.execute(f'DROP TABLE "{stage_name}"')
+
+
+def adbc_write_wkb_batch(conn, batch, table_name, geometry_col, geometry_type, srid, mode):
+    """
+    ADBC counterpart of create_wkb_table + write_wkb_chunk: the batch (WKB still
+    as binary or hex text) is ingested into a temporary staging table and PostGIS
+    builds the geometries with ST_GeomFromWKB on the way into the target.
+    """
+    stage_name = f"stage_{table_name}"
+    attr_names = [name for name in batch.schema.names if name != geometry_col]
+    geometry = batch.column(geometry_col)
+    if isinstance(geometry, pa.ExtensionArray):
+        # Staged as its plain binary/string storage (e.g. geoarrow.wkb)
+        batch = batch.set_column(batch.schema.get_field_index(geometry_col), geometry_col, geometry.storage)
+    wkb = f'"{geometry_col}"'
+    if not is_binary_type(batch.schema.field(geometry_col).type):
+        wkb = f"decode({wkb}, 'hex')"
+
+    with conn.cursor() as cur:
+        if mode != 'append':
+            # First batch: create the target from the Arrow schema, then add the geometry column
+            if attr_names:
+                empty_attrs = pa.Table.from_batches([batch]).select(attr_names).slice(0, 0)
+                cur.adbc_ingest(table_name, empty_attrs, mode=mode)
+            if_exists = {adbc_mode: option for option, adbc_mode in ADBC_INGEST_MODES.items()}[mode]
+            for statement in geometry_column_ddl(table_name, geometry_col, geometry_type, srid, if_exists,
+                                                 has_attributes=bool(attr_names)):
+                cur.execute(statement)
+
+        cur.adbc_ingest(stage_name, batch, mode='replace', temporary=True)
+        cur.execute(wkb_insert_select(table_name, stage_name, attr_names, geometry_col, wkb, srid))
+        # Dropped explicitly, since the transaction may span many batches
+        cur.execute(f'DROP TABLE "{stage_name}"')
+
+
+def open_dataset(path):
+    """
+    Open a Parquet file as a pyarrow dataset (for filter/projection pushdown).
+    Reads are memory-mapped, so pages come from the OS page cache rather than
+    being copied into Arrow buffers.
+    """
+    return ds.dataset(path, format="parquet", filesystem=pafs.LocalFileSystem(use_mmap=True))
+
+
+def rebatch(batches, batch_size):
+    """
+    Merge scanned batches into batches of at least `batch_size` rows (the last
+    may be smaller). The dataset scanner never merges row groups, so a file with
+    small row groups would otherwise be written in equally small batches.
+    """
+    buffer, buffered_rows = [], 0
+    for batch in batches:
+        buffer.append(batch)
+        buffered_rows += batch.num_rows
+        if buffered_rows >= batch_size:
+            yield from pa.Table.from_batches(buffer).combine_chunks().to_batches()
+            buffer, buffered_rows = [], 0
+    if buffer:
+        yield from pa.Table.from_batches(buffer).combine_chunks().to_batches()
+
+
+def parse_row_filter(filter_text):
+    """
+    Parse the row filter input into an Arrow expression. The input is a Python
+    literal in pyarrow's DNF filter format, e.g. [("year", "=", 2024)] or
+    [[("a", ">", 1)], [("b", "in", ["x", "y"])]] for OR-ed groups.
+    """
+    if not filter_text or not filter_text.strip():
+        return None
+    return pq.filters_to_expression(ast.literal_eval(filter_text.strip()))
+
+
+def plan_integer_downcasts(schema, parquet_metadatas):
+    """
+    Map int64 columns to the narrowest Postgres-compatible integer type (int16 ->
+    SMALLINT, int32 -> INTEGER) their Parquet min/max statistics allow. Columns
+    missing statistics in any row group are left alone.
+    """
+    int64_columns = {field.name for field in schema if pa.types.is_int64(field.type)}
+    bounds = {}
+    for parquet_metadata in parquet_metadatas:
+        for rg in range(parquet_metadata.num_row_groups):
+            row_group = parquet_metadata.row_group(rg)
+            for col in range(row_group.num_columns):
+                column = row_group.column(col)
+                name = column.path_in_schema
+                if name not in int64_columns:
+                    continue
+                stats = column.statistics
+                if stats is None or not stats.has_min_max:
+                    int64_columns.discard(name)
+                    bounds.pop(name, None)
+                    continue
+                low, high = bounds.get(name, (stats.min, stats.max))
+                bounds[name] = (min(low, stats.min), max(high, stats.max))
+
+    downcasts = {}
+    for name, (low, high) in bounds.items():
+        for target in (pa.int16(), pa.int32()):
+            info = np.iinfo(target.to_pandas_dtype())
+            if info.min <= low and high <= info.max:
+                downcasts[name] = target
+                break
+    return downcasts
+
+
+def downcast_batch(batch, downcasts):
+    """Cast a batch's columns per plan_integer_downcasts (checked casts, so bad stats raise)."""
+    if not downcasts:
+        return batch
+    fields, arrays = [], []
+    for field, array in zip(batch.schema, batch.columns):
+        target = downcasts.get(field.name)
+        if target is not None:
+            field, array = field.with_type(target), array.cast(target)
+        fields.append(field)
+        arrays.append(array)
+    return pa.RecordBatch.from_arrays(arrays, schema=pa.schema(fields, metadata=batch.schema.metadata))
+
+
+def drop_indexes(engine, table_name):
+    """
+    Drop the secondary indexes on `table_name` before a bulk append and return
+    their definitions so they can be rebuilt afterwards. Unique indexes and
+    indexes backing primary key/exclusion constraints are left alone, so the
+    load is still checked against them. Foreign keys are deliberately kept too:
+    re-adding one re-validates the whole table, and rows violating it would
+    already be committed by the time that fails.
+    """
+    with engine.begin() as conn:
+        indexes = conn.execute(text(
+            "SELECT quote_ident(n.nspname) || '.' || quote_ident(i.relname), pg_get_indexdef(i.oid) "
+            "FROM pg_index x "
+            "JOIN pg_class i ON i.oid = x.indexrelid "
+            "JOIN pg_namespace n ON n.oid = i.relnamespace "
+            "WHERE x.indrelid = to_regclass(:table) AND NOT x.indisunique "
+            "AND NOT EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conindid = x.indexrelid)"
+        ), {"table": f'"{table_name}"'}).all()
+        for index_name, _ in indexes:
+            conn.execute(text(f"DROP INDEX {index_name}"))
+    return [index_def for _, index_def in indexes]
+
+
+def recreate_indexes(engine, index_defs):
+    """
+    Rebuild indexes dropped by drop_indexes, several at once on separate connections.
+    Returns (definition, error) for every index that could not be rebuilt; one
+    failure doesn't stop the others.
+    """
+    def build(index_def):
+        with engine.begin() as conn:
+            conn.execute(text(f"SET LOCAL maintenance_work_mem = '{INDEX_MAINTENANCE_WORK_MEM}'"))
+            conn.execute(text(index_def))
+
+    failed = []
+    with ThreadPoolExecutor(max_workers=IMPORT_WORKERS) as executor:
+        futures = {executor.submit(build, index_def): index_def for index_def in index_defs}
+        for future, index_def in futures.items():
+            try:
+                future.result()
+            except Exception as e:
+                failed.append((index_def, e))
+    return failed
+
 
 st.set_page_config(page_title="Parquet to Postgres Importer", layout="wide")
 
@@ -30,21 +415,59 @@ if input_method == "Upload File (Small Files)":
     uploaded_file = st.file_uploader("Choose a Parquet/Geoparquet file", type=["parquet", "geoparquet"])
 else:
     file_path_input = st.text_input("Enter absolute file path (e.g. /mnt/data/big_file.parquet)")
-    if file_path_input and os.path.exists(file_path_input):
+    # A single file: row counts, batch sizing and GeoParquet metadata are read from its footer
+    if file_path_input and os.path.isfile(file_path_input):
         file_path = file_path_input
     elif file_path_input:
-        st.error("File not found.")
+        st.error("File not found (directories are not supported).")
+
+# Column projection: only the selected columns are decoded and imported
+selected_columns = None
+if uploaded_file or file_path:
+    try:
+        available_columns = pq.read_schema(uploaded_file or file_path).names
+        selected_columns = st.multiselect("Columns to import", available_columns, default=available_columns)
+    except Exception as schema_error:
+        st.warning(f"Could not read the Parquet schema: {schema_error}")
+    finally:
+        if uploaded_file:
+            uploaded_file.seek(0)
+
+    # Row filter: pushed down to the Parquet reader, so row groups whose statistics
+    # can't match are skipped without being read
+    row_filter_text = st.text_input(
+        "Row filter (optional)",
+        placeholder='[("year", "=", 2024), ("state", "in", ["CA", "NV"])]',
+        help="pyarrow filter list: (column, op, value) tuples are AND-ed; a list of such lists is OR-ed.",
+    )
+
+    # Narrow int64 columns whose min/max statistics fit INTEGER/SMALLINT: half the
+    # bytes (or less) on the wire and on disk
+    downcast_numerics = st.checkbox(
+        "Auto-downcast numerics",
+        help="Import int64 columns as INTEGER/SMALLINT when the file's statistics show the values fit. "
+             "Floats are left as-is since narrowing them loses precision.",
+    )
+else:
+    row_filter_text = None
+    downcast_numerics = False
 
 if st.button("Start Import"):
     if not db_name or not db_user or not db_password:
         st.error("Please fill in Database Connection details in the sidebar (Host, User, Password, DB Name).")
+    elif selected_columns == []:
+        st.error("Please select at least one column to import.")
     else:
         # Determine source
-        import pyarrow.parquet as pq
-        
         source = None
+        upload_path = None
         if input_method == "Upload File (Small Files)" and uploaded_file:
-            source = uploaded_file
+            # Spool the upload to a temp file so Arrow reads it memory-mapped from disk
+            # instead of holding a second in-memory copy of the whole file
+            uploaded_file.seek(0)
+            with tempfile.NamedTemporaryFile(suffix=".parquet", delete=False) as tmp:
+                shutil.copyfileobj(uploaded_file, tmp)
+            source = upload_path = tmp.name
         elif input_method == "Local File Path (Large Files)" and file_path:
             source = file_path
         
@@ -52,52 +475,81 @@ if st.button("Start Import"):
             db_url = f"postgresql://{db_user}:{db_password}@{db_host}:{db_port}/{db_name}"
             
             try:
-                engine = create_engine(db_url)
+                # psycopg 3 driver: COPY via cursor.copy()
+                engine = create_engine(db_url.replace("postgresql://", "postgresql+psycopg://", 1),
+                                       pool_size=IMPORT_WORKERS, max_overflow=1)
                 
                 # Ensure PostGIS extension is enabled
-                from sqlalchemy import text
                 with engine.connect() as conn:
                     conn.execute(text("CREATE EXTENSION IF NOT EXISTS postgis;"))
                     conn.commit()
                 
                 # --- PROBE STEP ---
-                # Attempt to read schema/metadata using Geopandas to support GeoParquet spec robustly
+                # Open the Parquet file as a dataset so the row filter and column
+                # selection are applied while reading. The footer read here is also
+                # where the GeoParquet metadata comes from; no rows are decoded to probe.
+                row_filter = parse_row_filter(row_filter_text)
+                dataset = open_dataset(source)
+                parquet_metadata = next(dataset.get_fragments()).metadata
+
                 detected_geometry_col = None
                 detected_crs = None
+                detected_geometry_type = 'Geometry'
                 is_spatial_file = False
                 
                 try:
-                    # Read just 1 row to sniff metadata
-                    # Note: read_parquet usually can read file paths or file-like objects
-                    probe_gdf = gpd.read_parquet(source, rows=1) if isinstance(source, str) else gpd.read_parquet(source)
-                    
-                    if isinstance(probe_gdf, gpd.GeoDataFrame):
+                    geo_meta = read_geo_metadata(parquet_metadata)
+                    if geo_meta:
                         is_spatial_file = True
-                        detected_geometry_col = probe_gdf.active_geometry_name or 'geometry'
-                        detected_crs = probe_gdf.crs
-                        st.success(f"Detected GeoParquet! Geometry Column: '{detected_geometry_col}', CRS: {detected_crs}")
-                except Exception as probe_error:
-                    # Not a geopandas readable file, or just standard parquet. 
-                    # We continue and try to detect manually in loop.
-                    # If it was a small upload file, we might have consumed the buffer.
-                    if hasattr(source, 'seek'):
-                        source.seek(0)
-                
-                # --- STREAMING STEP ---
-                # Open Parquet file using PyArrow
-                parquet_file = pq.ParquetFile(source)
+                        detected_geometry_col = geo_meta.get("primary_column", 'geometry')
+                        column_meta = geo_meta["columns"][detected_geometry_col]
+                        detected_crs = geo_column_crs(column_meta)
+                        detected_geometry_type = postgis_geometry_type(column_meta.get("geometry_types", []))
+                        st.success(f"Detected GeoParquet! Geometry Column: '{detected_geometry_col}', "
+                                   f"Type: {detected_geometry_type}, CRS: {detected_crs}")
+                except (ValueError, KeyError, pyproj.exceptions.CRSError) as probe_error:
+                    # Malformed geo metadata: treat it as standard parquet and let the
+                    # loop fall back to a 'geometry' column if there is one.
+                    is_spatial_file = False
+                    detected_geometry_col = None
+                    detected_crs = None
+                    detected_geometry_type = 'Geometry'
+                    st.warning(f"Ignoring unreadable GeoParquet metadata: {probe_error}")
+
+                # SRID for the geometry column DDL and ST_GeomFromWKB, resolved once
+                detected_srid = crs_to_srid(detected_crs)
                 
                 # Metadata detection
-                st.info(f"Detected {parquet_file.num_row_groups} row groups. Total rows (approx): {parquet_file.metadata.num_rows}")
+                st.info(f"Detected {parquet_metadata.num_row_groups} row groups. Total rows (approx): {parquet_metadata.num_rows}")
                 
-                # Iterate over batches
-                batch_size = 50000 
+                # --- STREAMING STEP ---
+                # Iterate over batches, sized to match the row groups on disk
+                if parquet_metadata.num_row_groups:
+                    row_group_rows = parquet_metadata.row_group(0).num_rows
+                    batch_size = min(max(row_group_rows, MIN_BATCH_ROWS), MAX_BATCH_ROWS)
+                else:
+                    batch_size = MIN_BATCH_ROWS
+
+                # Only for a table this import creates: an existing table keeps its column types
+                downcasts = {}
+                if downcast_numerics and if_exists_opt == 'append':
+                    st.info("Downcasting skipped: appending keeps the existing table's column types.")
+                elif downcast_numerics:
+                    downcasts = plan_integer_downcasts(
+                        dataset.schema, [fragment.metadata for fragment in dataset.get_fragments()]
+                    )
+                    if downcasts:
+                        st.info("Downcasting: " + ", ".join(f"{name} -> {target}" for name, target in downcasts.items()))
                 
                 progress_bar = st.progress(0)
                 status_text = st.empty()
                 
                 rows_processed = 0
-                total_rows = parquet_file.metadata.num_rows
+                if row_filter is not None:
+                    total_rows = dataset.count_rows(filter=row_filter)
+                    st.info(f"Rows matching filter: {total_rows}")
+                else:
+                    total_rows = parquet_metadata.num_rows
                 
                 if total_rows and total_rows > 0:
                    pass
@@ -105,98 +557,215 @@ if st.button("Start Import"):
                    # Fallback if metadata doesn't have rows
                    total_rows = 1 
 
-                # State for first chunk handling
-                is_first_chunk = True
-                
-                for batch in parquet_file.iter_batches(batch_size=batch_size):
-                    try:
-                        df_chunk = batch.to_pandas()
-                    except ValueError:
-                        # Fallback for KNIME or weird metadata where default conversion fails
-                        df_chunk = batch.to_pandas(ignore_metadata=True)
-                    except Exception as e:
-                         # Try one last time ignoring metadata just in case
-                         try:
-                             df_chunk = batch.to_pandas(ignore_metadata=True)
-                         except:
-                             raise e
-                    
-                    chunk_is_spatial = False
-                    chunk_to_write = df_chunk
-                    
-                    # Logic 1: We detected it was spatial via probe
-                    if is_spatial_file and detected_geometry_col in df_chunk.columns:
-                        chunk_is_spatial = True
-                        # If the column came in as WKB/bytes (common in Arrow->Pandas), convert it
-                        # If it came in as objects (already decoded?), ensure it's a GeoDataFrame
-                        
-                        col_data = df_chunk[detected_geometry_col]
-                        
-                        # Heuristic: convert to geometry objects if they look like bytes/WKB
-                        if col_data.dtype == 'object' or col_data.dtype == 'category' or col_data.dtype == 'string':
-                             # Try to convert from WKB if possible, or just pass to GeoDataFrame
-                             import shapely.wkb
-                             from shapely.errors import WKBReadingError
-                             
-                             # We can use gpd.from_wkb safely on bytes. 
-                             # If it's already objects, we might need a verify. 
-                             # Fast path: assume WKB if bytes.
-                             # Check first element type
-                             first_val = col_data.iloc[0] if len(col_data) > 0 else None
-                             
-                             if isinstance(first_val, bytes):
-                                 geometry_objects = gpd.GeoSeries.from_wkb(col_data)
-                             else:
-                                 # Already objects or strings? 
-                                 # If valid geometry objects, just passing them to GeoDataFrame is fine.
-                                 geometry_objects = col_data
-
-                             gdf_chunk = gpd.GeoDataFrame(df_chunk, geometry=geometry_objects)
+                # Whether the file's pandas metadata can be applied is decided on the first
+                # batch (written before any workers start) and reused for every later one
+                conversion = SimpleNamespace(pandas_kwargs=None)
+
+                def to_pandas(table):
+                    if conversion.pandas_kwargs is None:
+                        try:
+                            df = table.to_pandas()
+                            conversion.pandas_kwargs = {}
+                            return df
+                        except (pa.ArrowInvalid, ValueError, TypeError, KeyError):
+                            # Fallback for KNIME or weird metadata where default conversion fails
+                            conversion.pandas_kwargs = {'ignore_metadata': True}
+                    return table.to_pandas(**conversion.pandas_kwargs)
+
+                # Each thread keeps one connection (and one ADBC connection, if that path is
+                # used) with one open transaction for the whole import, instead of connecting
+                # and committing per batch. Opened on first use, committed or rolled back
+                # together by finish_connections.
+                worker_state = threading.local()
+                worker_connections = []
+
+                def worker_connection():
+                    if not hasattr(worker_state, 'conn'):
+                        worker_state.conn = engine.connect()
+                        worker_state.conn.begin()
+                        worker_connections.append(worker_state.conn)
+                    return worker_state.conn
+
+                def worker_adbc_connection():
+                    if not hasattr(worker_state, 'adbc_conn'):
+                        worker_state.adbc_conn = adbc_pg.connect(db_url)
+                        worker_connections.append(worker_state.adbc_conn)
+                    return worker_state.adbc_conn
+
+                def finish_connections(commit):
+                    """Commit (or roll back) and close every open connection; call once the workers are done."""
+                    while worker_connections:
+                        conn = worker_connections.pop()
+                        try:
+                            if commit:
+                                conn.commit()
+                            else:
+                                conn.rollback()
+                        finally:
+                            conn.close()
+                    # Only the calling thread's state; worker threads are finished by now
+                    vars(worker_state).clear()
+
+                def import_batch(batch, is_first_chunk=False):
+                    """Convert one Arrow batch and write it on this thread's connections. Called from worker threads, so no st.* calls in here."""
+                    current_if_exists = if_exists_opt if is_first_chunk else 'append'
+                    batch = downcast_batch(batch, downcasts)
+
+                    # Geometry detection on the Arrow schema, before anything is converted:
+                    # Logic 1 is the column found by the probe, Logic 2 the conventional 'geometry'
+                    geometry_col = detected_geometry_col if is_spatial_file else 'geometry'
+                    if geometry_col not in batch.schema.names:
+                        geometry_col = None
+                    geometry_type = batch.schema.field(geometry_col).type if geometry_col else None
+                    if geometry_type is not None and not is_wkb_type(geometry_type):
+                        raise ValueError(f"Geometry column '{geometry_col}' has unsupported type {geometry_type} (expected WKB)")
+
+                    if adbc_pg is not None and not (geometry_type is not None and pa.types.is_dictionary(storage_type(geometry_type))):
+                        # Arrow-native path: no pandas at all. A non-range pandas index is stored
+                        # as extra columns (e.g. __index_level_0__); drop them like to_sql(index=False) does
+                        index_cols = [c for c in (batch.schema.pandas_metadata or {}).get('index_columns', [])
+                                      if isinstance(c, str) and c in batch.schema.names]
+                        batch = batch.drop_columns(index_cols)
+                        adbc_mode = ADBC_INGEST_MODES[current_if_exists] if is_first_chunk else 'append'
+                        if geometry_col is None:
+                            adbc_write_batch(worker_adbc_connection(), batch, table_name, adbc_mode,
+                                             existing_table=if_exists_opt == 'append')
                         else:
-                             # Just cast
-                             gdf_chunk = gpd.GeoDataFrame(df_chunk, geometry=detected_geometry_col)
-
-                        # Apply detected CRS
-                        if detected_crs:
-                            gdf_chunk.set_crs(detected_crs, allow_override=True, inplace=True)
-                        elif gdf_chunk.crs is None:
-                            # Fallback
-                            gdf_chunk.set_crs(epsg=4326, inplace=True)
-                            
-                        chunk_to_write = gdf_chunk
-
-                    # Logic 2: Fallback manual detection (if probe failed but column exists)
-                    elif 'geometry' in df_chunk.columns:
-                        # Old logic fallback
-                        chunk_is_spatial = True
-                        gdf_chunk = gpd.GeoDataFrame(df_chunk, geometry=gpd.GeoSeries.from_wkb(df_chunk['geometry']))
-                        if gdf_chunk.crs is None:
-                             gdf_chunk.set_crs(epsg=4326, inplace=True)
-                        chunk_to_write = gdf_chunk
+                            adbc_write_wkb_batch(worker_adbc_connection(), batch, table_name, geometry_col,
+                                                 detected_geometry_type, detected_srid, adbc_mode)
+                        return batch.num_rows
+
+                    # Only the attribute columns go through pandas; the geometry column is
+                    # taken straight from Arrow
+                    attributes = batch.drop_columns([geometry_col]) if geometry_col else batch
+                    df_chunk = to_pandas(attributes)
+                    # to_pandas restores nullable Int64 columns from the pandas metadata,
+                    # which would undo the downcast
+                    for name, target in downcasts.items():
+                        if name in df_chunk.columns and isinstance(df_chunk[name].dtype, pd.Int64Dtype):
+                            df_chunk[name] = df_chunk[name].astype(f"Int{target.bit_width}")
 
                     # Write to DB
-                    current_if_exists = if_exists_opt if is_first_chunk else 'append'
-                    
-                    if chunk_is_spatial:
-                        chunk_to_write.to_postgis(table_name, engine, if_exists=current_if_exists, index=False)
+                    conn = worker_connection()
+                    if geometry_col:
+                        # Geometry stays WKB all the way; PostGIS parses it (see write_wkb_chunk)
+                        df_chunk[geometry_col] = bytea_input(batch.column(geometry_col))
+                        if is_first_chunk:
+                            create_wkb_table(df_chunk, table_name, conn, geometry_col,
+                                             detected_geometry_type, detected_srid, current_if_exists)
+                        write_wkb_chunk(df_chunk, table_name, conn, geometry_col, detected_srid)
                     else:
-                        chunk_to_write.to_sql(table_name, engine, if_exists=current_if_exists, index=False)
-                    
-                    rows_processed += len(df_chunk)
-                    is_first_chunk = False
-                    
-                    # Update progress
+                        df_chunk.to_sql(table_name, conn, if_exists=current_if_exists, index=False, method=psql_insert_copy)
+
+                    return batch.num_rows
+
+                # Redraw only when another whole percent is done (and not faster than
+                # PROGRESS_UPDATE_INTERVAL), using integer arithmetic throughout
+                progress_step = max(total_rows // 100, 1)
+                progress = SimpleNamespace(last_update=0.0, next_tick=progress_step)
+
+                def report_progress(force=False):
+                    if not force and rows_processed < progress.next_tick:
+                        return
+                    now = time.monotonic()
+                    if not force and now - progress.last_update < PROGRESS_UPDATE_INTERVAL:
+                        return
+                    progress.last_update = now
+                    progress.next_tick = (rows_processed // progress_step + 1) * progress_step
+
                     if total_rows > 1: # Avoid division by zero
-                         progress = min(rows_processed / total_rows, 1.0)
-                         progress_bar.progress(progress)
+                         progress_bar.progress(min(rows_processed * 100 // total_rows, 100))
                     
                     status_text.text(f"Processed {rows_processed} rows...")
+
+                # Appending into an indexed table: drop the indexes for the load and
+                # rebuild them once at the end instead of updating them row by row.
+                dropped_indexes = drop_indexes(engine, table_name) if if_exists_opt == 'append' else []
+                if dropped_indexes:
+                    st.info(f"Dropped {len(dropped_indexes)} index(es) for the load; they will be rebuilt afterwards.")
+
+                load_unlogged = False
+                try:
+                    batches = dataset.to_batches(batch_size=batch_size, filter=row_filter, columns=selected_columns)
+                    # Filtered scans can yield empty batches for row groups with no matches; small
+                    # row groups are merged up to batch_size (see rebatch)
+                    batches = rebatch((batch for batch in batches if batch.num_rows), batch_size)
+
+                    # The first batch is written and committed on its own so it can create/replace
+                    # the table and the workers' connections see it; everything after it only
+                    # appends and can run concurrently.
+                    first_batch = next(batches, None)
+                    if first_batch is not None:
+                        try:
+                            rows_processed += import_batch(first_batch, is_first_chunk=True)
+                            finish_connections(commit=True)
+                        finally:
+                            finish_connections(commit=False)
+                        report_progress()
+
+                    # A table this import just created is loaded UNLOGGED (no WAL per row) and
+                    # switched to LOGGED once at the end, whether or not the load succeeds.
+                    load_unlogged = first_batch is not None and if_exists_opt in ('replace', 'fail')
+                    if load_unlogged:
+                        with engine.begin() as conn:
+                            conn.execute(text(f'ALTER TABLE "{table_name}" SET UNLOGGED'))
+                        st.info("Loading into an UNLOGGED table; if the server crashes mid-import the table "
+                                "comes back empty. It is switched to LOGGED when the load finishes.")
+
+                    # Arrow keeps decoding the file here while worker threads convert and write
+                    # earlier batches, each on its own connection(s). The number of batches
+                    # in flight is capped so memory stays bounded on huge files. Everything
+                    # after the first batch is committed together once all of it is written.
+                    executor = ThreadPoolExecutor(max_workers=IMPORT_WORKERS)
+                    try:
+                        pending = set()
+                        for batch in batches:
+                            pending.add(executor.submit(import_batch, batch))
+                            if len(pending) >= IMPORT_WORKERS * 2:
+                                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                                for future in done:
+                                    rows_processed += future.result()
+                                    report_progress()
+
+                        for future in as_completed(pending):
+                            rows_processed += future.result()
+                            report_progress()
+                        report_progress(force=True)
+
+                        finish_connections(commit=True)
+                    finally:
+                        executor.shutdown(cancel_futures=True)
+                        # On failure, rolls back every batch after the first on both the SQLAlchemy
+                        # and ADBC connections (no-op after the commit above). The first batch,
+                        # and so the table itself, stays committed.
+                        finish_connections(commit=False)
+                finally:
+                    if load_unlogged:
+                        status_text.text("Switching table to LOGGED...")
+                        try:
+                            with engine.begin() as conn:
+                                conn.execute(text(f'ALTER TABLE "{table_name}" SET LOGGED'))
+                        except Exception as e:
+                            # Warn instead of raising, so an import error isn't masked
+                            st.warning(f"Table '{table_name}' is still UNLOGGED ({e}). Switch it back manually:")
+                            st.code(f'ALTER TABLE "{table_name}" SET LOGGED;', language="sql")
+                    if dropped_indexes:
+                        status_text.text(f"Rebuilding {len(dropped_indexes)} index(es)...")
+                        # Report rebuild failures instead of raising, so an import error isn't masked
+                        failed_indexes = recreate_indexes(engine, dropped_indexes)
+                        for index_def, error in failed_indexes:
+                            st.error(f"Could not rebuild an index dropped for the load ({error}). "
+                                     f"Recreate it manually:")
+                            st.code(f"{index_def};", language="sql")
                 
                 st.success(f"Successfully imported {rows_processed} rows to table '{table_name}'!")
                 
             except Exception as e:
                 st.error(f"Error during import: {e}")
                 st.exception(e)
+            finally:
+                if upload_path:
+                    os.remove(upload_path)
         else:
             st.error("Please provide a valid file.")
 